@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
 import google.generativeai as genai
 import os
+import io
+from concurrent.futures import ThreadPoolExecutor
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -27,39 +32,262 @@ def configure_api():
         st.error(f"An error occurred during API configuration: {e}")
         return False
 
-# --- DATA LOADING AND PREPROCESSING (No changes here) ---
+# --- DATA LOADING AND PREPROCESSING ---
+# Only the columns the report uses are read; dtypes are applied by the CSV parser itself.
+# Amounts stay float64: float32 keeps only ~7 significant digits, which would round
+# larger amounts at parse time (9876543.21 reads as 9876543.0) and lose paise in totals.
+# Low-cardinality labels are categorical so groupbys hash integer codes instead of strings.
+TRANSACTION_COLUMNS = ['Transaction_Date', 'Description', 'Debit_Amount', 'Credit_Amount', 'Category', 'Beneficiary_Name']
+TRANSACTION_DTYPES = {
+    'Debit_Amount': 'float64',
+    'Credit_Amount': 'float64',
+    'Category': 'category',
+    'Beneficiary_Name': 'category'
+}
+AMOUNT_COLUMNS = ['Debit_Amount', 'Credit_Amount']
+# Uploads above this size are streamed in chunks and reduced to the report aggregates
+# directly, so peak memory stays bounded by one chunk rather than the whole file.
+# Must stay below Streamlit's upload cap (server.maxUploadSize, 200 MB by default).
+LARGE_FILE_BYTES = 50 * 1024 * 1024
+CHUNK_ROWS = 200_000
+
+def read_transactions(source, parse_amounts=True, **kwargs):
+    """Reads the transaction CSV, parsing dtypes and dates in the same pass.
+
+    With parse_amounts=False the amount columns are left as text for
+    preprocess_transactions to coerce, for files where the strict parse fails.
+    """
+    if parse_amounts:
+        dtype = TRANSACTION_DTYPES
+    else:
+        dtype = {col: t for col, t in TRANSACTION_DTYPES.items() if col not in AMOUNT_COLUMNS}
+    return pd.read_csv(
+        source,
+        usecols=TRANSACTION_COLUMNS,
+        dtype=dtype,
+        parse_dates=['Transaction_Date'],
+        date_format='%Y-%m-%d',
+        **kwargs
+    )
+
+def preprocess_transactions(df):
+    """Cleans a frame of transactions and adds the derived report columns.
+
+    Works row-locally, so it applies equally to a whole file or a single chunk.
+    """
+    # Dates that didn't match the expected format are left as strings; only then fall back to (slow) inference
+    if not pd.api.types.is_datetime64_any_dtype(df['Transaction_Date']):
+        df['Transaction_Date'] = pd.to_datetime(df['Transaction_Date'])
+    # Amounts read as text (e.g. "1,000.50" or "N/A" cells) are coerced; unparseable cells count as 0
+    for col in AMOUNT_COLUMNS:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df.fillna({'Debit_Amount': 0, 'Credit_Amount': 0}, inplace=True)
+    # Truncate to the first of the month in numpy; formatted as text only when displayed
+    df['Month'] = df['Transaction_Date'].to_numpy().astype('datetime64[M]')
+    # Inflows without a named beneficiary fall back to the description
+    df['Inflow_Source'] = df['Beneficiary_Name'].astype(object).fillna(df['Description']).astype('category')
+    return df
+
 @st.cache_data
 def load_and_preprocess_data(uploaded_file):
     """Loads and preprocesses the transaction data from a CSV file."""
     try:
-        df = pd.read_csv(uploaded_file)
-        # Data Cleaning and Transformation
-        df['Transaction_Date'] = pd.to_datetime(df['Transaction_Date'])
-        df['Debit_Amount'] = pd.to_numeric(df['Debit_Amount'], errors='coerce').fillna(0)
-        df['Credit_Amount'] = pd.to_numeric(df['Credit_Amount'], errors='coerce').fillna(0)
-        df['Month'] = df['Transaction_Date'].dt.to_period('M').astype(str)
-        # Correcting potential data entry errors in the sample
-        df.loc[df['Description'].str.contains('Freelance|Dividend|Refund|Interest', case=False, na=False), 'Transaction_Type'] = 'Credit'
-        return df
+        try:
+            df = read_transactions(uploaded_file)
+        except ValueError:
+            # A non-numeric amount cell fails the strict parse; re-read with amounts as text
+            uploaded_file.seek(0)
+            df = read_transactions(uploaded_file, parse_amounts=False)
+        return preprocess_transactions(df)
+    except Exception as e:
+        st.error(f"Error loading or processing data: {e}")
+        return None
+
+# --- AGGREGATIONS ---
+# Per-key sums and counts. Partial results from separate chunks can be folded together
+# with fold_totals before the display-side sorting/selection is applied.
+def monthly_totals(df):
+    """Income and spending sums per month, in one numpy pass.
+
+    Months are turned into integer offsets from the earliest month and both sums are
+    accumulated with np.bincount, skipping pandas' groupby machinery for two plain sums.
+    """
+    months = df['Month'].to_numpy().astype('datetime64[M]')
+    present = ~np.isnat(months)
+    codes = months[present].astype(np.int64)
+    first = codes.min() if codes.size else 0
+    codes -= first
+
+    income = np.bincount(codes, weights=df['Credit_Amount'].to_numpy()[present])
+    spending = np.bincount(codes, weights=df['Debit_Amount'].to_numpy()[present])
+    counts = np.bincount(codes, minlength=len(income))
+    # Only months that actually have transactions, as groupby would return
+    observed = np.flatnonzero(counts)
+    return pd.DataFrame(
+        {'Total_Income': income[observed], 'Total_Spending': spending[observed]},
+        index=pd.Index((observed + first).astype('datetime64[M]'), name='Month'),
+        # np.bincount gives int64 for empty input (no dated rows); sums are always float
+        dtype='float64'
+    )
+
+def category_totals(df):
+    """Spending and income sums per category."""
+    # One pass over the data for both sides; categories with no debits/credits are dropped after summing
+    return df.groupby('Category', observed=True).agg(
+        Total_Spending=('Debit_Amount', 'sum'),
+        Total_Income=('Credit_Amount', 'sum')
+    )
+
+def flow_totals_by_code(keys, amounts):
+    """Sum and count of positive amounts per key of a categorical column.
+
+    Accumulated over the integer category codes with np.bincount in a single pass, so no
+    per-group pandas objects are built even when there are very many distinct keys.
+    """
+    codes = keys.cat.codes.to_numpy()
+    values = amounts.to_numpy()
+    # Same rows groupby would use: positive amounts with a non-missing key (code -1)
+    mask = (values > 0) & (codes >= 0)
+    codes, values = codes[mask], values[mask]
+
+    n_keys = len(keys.cat.categories)
+    sums = np.bincount(codes, weights=values, minlength=n_keys)
+    counts = np.bincount(codes, minlength=n_keys)
+    # Only keys that actually occur, in category order, as groupby(observed=True) returns
+    observed = np.flatnonzero(counts)
+    return pd.DataFrame(
+        {'sum': sums[observed], 'count': counts[observed]},
+        index=pd.Index(keys.cat.categories[observed], name=keys.name)
+    )
+
+def flow_totals(df):
+    """Debit sum/count per beneficiary and credit sum/count per inflow source."""
+    outflows = flow_totals_by_code(df['Beneficiary_Name'], df['Debit_Amount'])
+    inflows = flow_totals_by_code(df['Inflow_Source'], df['Credit_Amount'])
+    return outflows, inflows
+
+def fold_totals(running, partial):
+    """Adds one chunk's per-key totals into the running totals."""
+    # Each chunk infers its own category set, so align categorical keys as plain labels
+    if isinstance(partial.index, pd.CategoricalIndex):
+        partial.index = partial.index.astype(object)
+    partial = partial.astype('float64')
+    return partial if running is None else running.add(partial, fill_value=0)
+
+def split_category_totals(totals):
+    """Splits category totals into sorted, non-zero spending and income series."""
+    spending_by_cat = totals['Total_Spending'][totals['Total_Spending'] > 0].sort_values(ascending=False)
+    income_by_cat = totals['Total_Income'][totals['Total_Income'] > 0].sort_values(ascending=False)
+    return spending_by_cat, income_by_cat
+
+def top_flows(totals, k):
+    """Top-k rows of a flow sum/count frame, labelled for display."""
+    # Partial selection instead of a full sort; k is tiny next to the number of keys
+    top = totals.nlargest(k, 'sum')
+    return top.rename(columns={'sum': 'Total Amount', 'count': 'Frequency'})
+
+# These small reduced frames are served from the cache on every widget interaction.
+# They are keyed on the upload's file_id rather than the DataFrame: Streamlit only hashes
+# a row sample of large frames, so two same-length uploads could otherwise collide.
+@st.cache_data
+def get_monthly_summary(_df, file_id):
+    """Total income and spending per month."""
+    return monthly_totals(_df).reset_index()
+
+@st.cache_data
+def get_category_totals(_df, file_id):
+    """Spending and income per category, each sorted and limited to non-zero categories."""
+    return split_category_totals(category_totals(_df))
+
+@st.cache_data
+def get_top_flows(_df, file_id, k=10):
+    """Top-k outflow beneficiaries and inflow sources by total amount."""
+    outflow_totals, inflow_totals = flow_totals(_df)
+    return top_flows(outflow_totals, k), top_flows(inflow_totals, k)
+
+def fold_report_chunks(chunks, k):
+    """Folds the report aggregates over an iterator of raw transaction chunks.
+
+    Returns the same (row count, monthly summary, spending/income by category,
+    top outflows/inflows) as the in-memory path without materializing the full frame.
+    """
+    n_rows = 0
+    monthly = categories = outflows = inflows = None
+    for chunk in chunks:
+        chunk = preprocess_transactions(chunk)
+        n_rows += len(chunk)
+        monthly = fold_totals(monthly, monthly_totals(chunk))
+        categories = fold_totals(categories, category_totals(chunk))
+        chunk_outflows, chunk_inflows = flow_totals(chunk)
+        outflows = fold_totals(outflows, chunk_outflows)
+        inflows = fold_totals(inflows, chunk_inflows)
+
+    spending_by_cat, income_by_cat = split_category_totals(categories)
+    return (
+        n_rows,
+        monthly.reset_index(),
+        spending_by_cat,
+        income_by_cat,
+        top_flows(outflows.astype({'count': 'int64'}), k),
+        top_flows(inflows.astype({'count': 'int64'}), k)
+    )
+
+@st.cache_data
+def load_report_chunked(uploaded_file, k=10):
+    """Streams a large CSV in chunks and folds the report aggregates incrementally."""
+    try:
+        try:
+            return fold_report_chunks(read_transactions(uploaded_file, chunksize=CHUNK_ROWS), k)
+        except ValueError:
+            # A non-numeric amount cell in any chunk fails the strict parse; start over with amounts as text
+            uploaded_file.seek(0)
+            return fold_report_chunks(read_transactions(uploaded_file, parse_amounts=False, chunksize=CHUNK_ROWS), k)
     except Exception as e:
         st.error(f"Error loading or processing data: {e}")
         return None
 
 # --- AI-POWERED ANALYSIS ---
-def get_gemini_insights(df):
-    """Generates financial insights using the Gemini API."""
-    if len(df) > 500:
-        data_sample = df.sample(500).to_csv(index=False)
-    else:
-        data_sample = df.to_csv(index=False)
+@st.cache_resource
+def get_model():
+    """Builds the Gemini model client once and shares it across reruns and sessions."""
+    return genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
 
-    model = genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
+# The pool is shared by every session, so it is sized for concurrent users rather than
+# per-session work; the threads only wait on network I/O.
+GEMINI_MAX_WORKERS = 32
+
+@st.cache_resource
+def get_executor():
+    """Shared thread pool so the Gemini call can run while the dashboard tabs render."""
+    return ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix='gemini')
+
+@st.cache_data(show_spinner=False)
+def get_gemini_insights(monthly_summary, spending_by_cat, income_by_cat, outflows, inflows):
+    """Generates financial insights using the Gemini API.
+
+    The prompt is built from the dashboard's aggregates rather than raw rows, which keeps
+    it short regardless of upload size. Cached on those (small) frames, so reruns on the
+    same file skip the API round-trip. Errors propagate uncached.
+    """
     prompt = f"""
     You are an expert financial analyst. Your task is to provide a detailed financial insight report based on the following customer transaction data.
-    The data is provided in CSV format below.
+    The data has been summarised into the Markdown tables below.
+
+    **Monthly Income vs. Spending:**
+    {monthly_summary.to_markdown(index=False)}
 
-    **Data:**
-    {data_sample}
+    **Top Spending Categories:**
+    {spending_by_cat.head(10).to_markdown()}
+
+    **Top Income Categories:**
+    {income_by_cat.head(10).to_markdown()}
+
+    **Top Outflows (Debits) by Beneficiary:**
+    {outflows.to_markdown()}
+
+    **Top Inflows (Credits) by Source:**
+    {inflows.to_markdown()}
 
     **Instructions:**
     Analyze the data and generate a comprehensive report in Markdown format. The report should include the following sections:
@@ -83,11 +311,63 @@ def get_gemini_insights(df):
 
     Structure your response clearly with headers for each section. Be insightful and professional.
     """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"Could not generate insights due to an error: {e}"
+    response = get_model().generate_content(prompt)
+    return response.text
+
+# --- CHART RENDERING ---
+# Charts are rendered to PNG once per aggregate and served from the cache afterwards,
+# so reruns skip matplotlib entirely. Figures are built on an Agg canvas directly,
+# bypassing pyplot's global figure manager, and are simply garbage-collected.
+def new_figure(figsize):
+    """Creates a standalone figure with a single axes on a non-interactive Agg canvas."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+def fig_to_png(fig):
+    """Serializes a figure to PNG bytes, matching st.pyplot's defaults."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=200, bbox_inches='tight')
+    return buf.getvalue()
+
+@st.cache_data
+def render_monthly_chart_png(monthly_summary):
+    """Grouped bar chart of monthly income vs. spending."""
+    # The sums are already aggregated, so plain side-by-side bars are drawn directly
+    # rather than going through seaborn's estimator machinery
+    x = np.arange(len(monthly_summary))
+    width = 0.4
+
+    fig, ax = new_figure(figsize=(10, 6))
+    ax.bar(x - width / 2, monthly_summary['Total_Income'], width, color='#00B894', label='Total_Income')
+    ax.bar(x + width / 2, monthly_summary['Total_Spending'], width, color='#D63031', label='Total_Spending')
+    ax.set_xticks(x, monthly_summary['Month'])
+    ax.set_xlabel('Month')
+    ax.legend(title='Transaction Type')
+    ax.set_title('Monthly Income vs. Spending Overview')
+    ax.set_ylabel('Amount')
+    ax.tick_params(axis='x', rotation=45)
+    fig.patch.set_alpha(0) # Make background transparent for Streamlit theme
+    ax.patch.set_alpha(0)
+    return fig_to_png(fig)
+
+@st.cache_data
+def render_donut_chart_png(totals, title, palette=None):
+    """Donut chart of a per-category totals series."""
+    fig, ax = new_figure(figsize=(8, 8))
+    ax.pie(
+        totals,
+        labels=totals.index,
+        autopct='%1.1f%%',
+        startangle=90,
+        colors=sns.color_palette(palette, len(totals)) if palette else None,
+        wedgeprops=dict(width=0.4), # This creates the donut hole
+        pctdistance=0.8
+    )
+    ax.set_title(title)
+    fig.patch.set_alpha(0)
+    ax.patch.set_alpha(0)
+    return fig_to_png(fig)
 
 # --- MAIN APPLICATION LOGIC ---
 def main():
@@ -113,46 +393,39 @@ def main():
     )
 
     if uploaded_file is not None:
-        df = load_and_preprocess_data(uploaded_file)
+        # Aggregates shared by the AI report and the dashboard tabs
+        if uploaded_file.size > LARGE_FILE_BYTES:
+            report = load_report_chunked(uploaded_file)
+        else:
+            df = load_and_preprocess_data(uploaded_file)
+            file_id = uploaded_file.file_id
+            report = None if df is None else (
+                len(df),
+                get_monthly_summary(df, file_id),
+                *get_category_totals(df, file_id),
+                *get_top_flows(df, file_id)
+            )
 
-        if df is not None:
-            st.success(f"Successfully loaded {len(df)} transactions.")
+        if report is not None:
+            n_rows, monthly_summary, spending_by_cat, income_by_cat, outflows, inflows = report
+            st.success(f"Successfully loaded {n_rows} transactions.")
+            monthly_summary['Month'] = monthly_summary['Month'].dt.strftime('%Y-%m')
+
+            # Start the (slow) Gemini request now; the charts render while it is in flight
+            # and the advisor tab waits on the result last.
+            insights_future = get_executor().submit(get_gemini_insights, monthly_summary, spending_by_cat, income_by_cat, outflows, inflows)
             
             tab1, tab2, tab3, tab4 = st.tabs(["🤖 AI Financial Advisor", "📈 Income vs. Spending", "📊 Category Deep-Dive", "🔄 Transaction Flow"])
 
             with tab1:
                 st.header("🤖 AI-Powered Financial Advisor")
-                with st.spinner("Your personal AI advisor is analyzing your finances..."):
-                    insights = get_gemini_insights(df)
-                    st.markdown(insights)
 
             with tab2:
                 st.header("📈 Monthly Income vs. Spending")
-                monthly_summary = df.groupby('Month').agg(
-                    Total_Income=('Credit_Amount', 'sum'),
-                    Total_Spending=('Debit_Amount', 'sum')
-                ).reset_index()
 
                 # --- CHART MODIFICATION: Monthly Summary ---
-                # We need to "melt" the dataframe to make it suitable for seaborn's grouped bar plot
-                monthly_summary_melted = monthly_summary.melt(id_vars='Month', var_name='Transaction Type', value_name='Amount')
-                
-                fig_monthly, ax = plt.subplots(figsize=(10, 6))
-                sns.barplot(
-                    data=monthly_summary_melted,
-                    x='Month',
-                    y='Amount',
-                    hue='Transaction Type',
-                    palette={'Total_Income': '#00B894', 'Total_Spending': '#D63031'},
-                    ax=ax
-                )
-                ax.set_title('Monthly Income vs. Spending Overview')
-                ax.set_ylabel('Amount')
-                ax.tick_params(axis='x', rotation=45)
-                fig_monthly.patch.set_alpha(0) # Make background transparent for Streamlit theme
-                ax.patch.set_alpha(0)
-                st.pyplot(fig_monthly)
-                st.dataframe(monthly_summary, use_container_width=True)
+                st.image(render_monthly_chart_png(monthly_summary), use_container_width=True)
+                st.dataframe(monthly_summary, use_container_width=True, hide_index=True)
 
             with tab3:
                 st.header("📊 Spending and Income Category Analysis")
@@ -160,44 +433,17 @@ def main():
 
                 with col1:
                     st.subheader("Spending by Category")
-                    spending_by_cat = df[df['Debit_Amount'] > 0].groupby('Category')['Debit_Amount'].sum().sort_values(ascending=False)
-                    
+
                     # --- CHART MODIFICATION: Spending Pie ---
-                    fig_spending, ax = plt.subplots(figsize=(8, 8))
-                    ax.pie(
-                        spending_by_cat,
-                        labels=spending_by_cat.index,
-                        autopct='%1.1f%%',
-                        startangle=90,
-                        wedgeprops=dict(width=0.4), # This creates the donut hole
-                        pctdistance=0.8
-                    )
-                    ax.set_title('Spending Distribution')
-                    fig_spending.patch.set_alpha(0)
-                    ax.patch.set_alpha(0)
-                    st.pyplot(fig_spending)
-                    st.dataframe(spending_by_cat.reset_index(), use_container_width=True)
+                    st.image(render_donut_chart_png(spending_by_cat, 'Spending Distribution'), use_container_width=True)
+                    st.dataframe(spending_by_cat, use_container_width=True)
 
                 with col2:
                     st.subheader("Income by Category")
-                    income_by_cat = df[df['Credit_Amount'] > 0].groupby('Category')['Credit_Amount'].sum().sort_values(ascending=False)
-                    
+
                     # --- CHART MODIFICATION: Income Pie ---
-                    fig_income, ax = plt.subplots(figsize=(8, 8))
-                    ax.pie(
-                        income_by_cat,
-                        labels=income_by_cat.index,
-                        autopct='%1.1f%%',
-                        startangle=90,
-                        colors=sns.color_palette('Greens_r', len(income_by_cat)),
-                        wedgeprops=dict(width=0.4),
-                        pctdistance=0.8
-                    )
-                    ax.set_title('Income Sources')
-                    fig_income.patch.set_alpha(0)
-                    ax.patch.set_alpha(0)
-                    st.pyplot(fig_income)
-                    st.dataframe(income_by_cat.reset_index(), use_container_width=True)
+                    st.image(render_donut_chart_png(income_by_cat, 'Income Sources', palette='Greens_r'), use_container_width=True)
+                    st.dataframe(income_by_cat, use_container_width=True)
 
             with tab4:
                 # --- NO CHANGES in this tab, as it only displays dataframes ---
@@ -206,17 +452,20 @@ def main():
 
                 with col3:
                     st.subheader("Top 10 Outflows (Debits)")
-                    outflows = df[df['Debit_Amount'] > 0].groupby('Beneficiary_Name')['Debit_Amount'].agg(['sum', 'count']).sort_values(by='sum', ascending=False).head(10)
-                    outflows = outflows.rename(columns={'sum': 'Total Amount', 'count': 'Frequency'})
                     st.dataframe(outflows, use_container_width=True)
 
                 with col4:
                     st.subheader("Top 10 Inflows (Credits)")
-                    df['Inflow_Source'] = df.apply(lambda row: row['Beneficiary_Name'] if pd.notna(row['Beneficiary_Name']) else row['Description'], axis=1)
-                    inflows = df[df['Credit_Amount'] > 0].groupby('Inflow_Source')['Credit_Amount'].agg(['sum', 'count']).sort_values(by='sum', ascending=False).head(10)
-                    inflows = inflows.rename(columns={'sum': 'Total Amount', 'count': 'Frequency'})
                     st.dataframe(inflows, use_container_width=True)
 
+            with tab1:
+                with st.spinner("Your personal AI advisor is analyzing your finances..."):
+                    try:
+                        insights = insights_future.result()
+                    except Exception as e:
+                        insights = f"Could not generate insights due to an error: {e}"
+                    st.markdown(insights)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file